@@ -5,16 +5,59 @@ import pandas as pd
 import numpy as np
 from scipy.signal import find_peaks
 from matplotlib.widgets import Button # Import Button widget
+from matplotlib.figure import Figure # Off-screen figure for batch export
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import sys
+import time # For throttling redraws while navigating
+import re # For sanitizing filenames
+import codecs # For normalizing detected encoding names
+import csv # For writing the results file
 import os # Add os import for directory creation
 import os.path # Import for path manipulation
+from functools import lru_cache # For caching get_base_filename
+from concurrent.futures import ProcessPoolExecutor # For saving all plots in parallel
 from tkinter import Tk, filedialog # Import for file dialog
 
+# Optional: pyarrow parses CSV files much faster than the default C engine
+try:
+    import pyarrow # noqa: F401
+    CSV_ENGINE = 'pyarrow'
+except ImportError:
+    CSV_ENGINE = 'c'
+
+# Optional: python-calamine reads Excel files much faster than openpyxl/xlrd
+try:
+    import python_calamine # noqa: F401
+    EXCEL_ENGINE = 'calamine'
+except ImportError:
+    EXCEL_ENGINE = None # Let pandas pick openpyxl/xlrd
+
+# Optional: numba compiles the click-snapping loop for very wide rows
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# Optional: charset-normalizer guesses the encoding of CSV files that are neither UTF-8 nor GBK
+try:
+    from charset_normalizer import from_bytes
+except ImportError:
+    from_bytes = None
+
 # --- Configuration ---
 PLOT_DIR = 'plots' # Directory to save plots
+BATCH_PLOT_DPI = 150 # Resolution of plots saved with 'a' (single plots are saved at 300 dpi)
+NAV_REDRAW_INTERVAL = 0.016 # Minimum seconds between redraws while an arrow key is held (~60 fps)
+PARALLEL_EXPORT_MIN_ROWS = 20 # Use worker processes for 'a' only from this many rows (pool startup is not free)
+FAST_IO = True # Cache Excel/CSV files (CSV only if read as UTF-8/GBK) as a '.feather' sidecar (needs pyarrow) for faster reloads
 # Adjust these based on your data characteristics if needed
 PEAK_PROMINENCE = 0.1 # How much a peak stands out from the surrounding baseline
 PEAK_WIDTH = 1       # Minimum width of a peak
+PARALLEL_PEAKS_MIN_ROWS = 2000 # Find peaks in worker processes after loading only from this many rows
+POINT_COLORS = {'left': 'red', 'top': 'blue', 'right': 'purple'} # Marker colors for each selection point
+POINT_TYPES = ('left', 'top', 'right') # Order of the (x, y) column pairs in the results array
+
+UNSAFE_FILENAME_CHARS = re.compile(r'[^\w .-]') # Anything except letters, digits, '_', ' ', '.', '-'
 
 # --- Global Variables ---
 data = None
@@ -25,14 +68,32 @@ fig, ax = None, None
 line = None
 scatter_peaks = None
 scatter_selected = None
-selected_points = {'top': None, 'left': None, 'right': None}
-results = {} # To store results for each row
+selection_artists = {} # Marker and annotation for each selection point
+coord_text_box = None # Text box showing the selected coordinates
+displayed_row = None # Row index shown by the persistent artists, None forces a rescale on the next update
+plot_background = None # Cached bitmap of the static plot, used for blitting selection updates
+plot_dir_ready = False # Set once PLOT_DIR is known to exist, so saving does not stat it every time
+last_draw_time = 0.0 # perf_counter() time of the last navigation redraw
+redraw_timer = None # Pending trailing redraw for throttled navigation
+export_state = None # Off-screen figure used by _render_one, created once per (worker) process
+results = None # (num_rows, 6) array of selections [left_x, left_y, top_x, top_y, right_x, right_y], NaN if unset
 current_x_data = None # Store x data for snapping
 current_y_data = None # Store y data for snapping
+x_axis = None # Shared x values (column labels) as a float64 array
+x_is_sorted = False # Whether x_axis is strictly increasing (enables binary search when snapping clicks)
+y_values = None # Contiguous float64 array of all rows shared with data, indexed by row position
+row_labels = None # Row labels (first column) as an array
+safe_labels = [] # Row labels sanitized for use in filenames
 peak_candidates = {} # To store peak candidates for each row
+line_cache = None # ((row, first, last, bins), (x, y)) of the line data currently drawn, reset for a new file
 
 # --- Functions ---
 
+def make_safe_filename(name):
+    """Replaces characters that are unsafe in filenames with underscores."""
+    return UNSAFE_FILENAME_CHARS.sub('_', name).rstrip()
+
+@lru_cache(maxsize=16)
 def get_base_filename(filepath):
     """Extracts the base name of a file without extension."""
     if not filepath:
@@ -40,30 +101,121 @@ def get_base_filename(filepath):
     base = os.path.basename(filepath)
     name, _ = os.path.splitext(base)
     # Sanitize the name for use in filenames
-    safe_name = "".join(c if c.isalnum() or c in (' ', '.', '_', '-') else '_' for c in name).rstrip()
-    return safe_name
+    return make_safe_filename(name)
+
+def get_sidecar_path(filepath):
+    """Returns the path of the Feather cache file kept next to an Excel/CSV file."""
+    return filepath + '.feather'
+
+def restore_frame_layout(df):
+    """Sets the row labels of a Parquet/Feather frame as index and its column names as numeric x values."""
+    # A frame saved with to_parquet() keeps its row labels as index; only a default index means they are in a column
+    if isinstance(df.index, pd.RangeIndex):
+        df = df.set_index(df.columns[0])
+    x_values = pd.to_numeric(df.columns, errors='coerce')
+    if x_values.isna().any():
+        # Non-numeric header, fall back to column positions like the Excel/CSV readers
+        x_values = range(1, len(df.columns) + 1)
+    df.columns = x_values
+    return df
+
+def load_sidecar(filepath):
+    """Loads the Feather sidecar of a file if it exists and is not older than the file itself."""
+    sidecar_path = get_sidecar_path(filepath)
+    if not os.path.exists(sidecar_path) or os.path.getmtime(sidecar_path) < os.path.getmtime(filepath):
+        return None
+    try:
+        df = restore_frame_layout(pd.read_feather(sidecar_path))
+        print(f"Loaded cached data from {sidecar_path} with shape: {df.shape}")
+        return df
+    except Exception as e: # e.g. pyarrow not installed or corrupt cache
+        print(f"Could not read cache file '{sidecar_path}', loading original file instead: {e}")
+        return None
+
+def write_sidecar(filepath, df):
+    """Writes a Feather copy of the cleaned data next to the original file for faster reloads."""
+    sidecar_path = get_sidecar_path(filepath)
+    try:
+        # Feather needs a default index and string column names
+        sidecar_df = df.reset_index()
+        sidecar_df.columns = ['label'] + [str(c) for c in df.columns]
+        sidecar_df.to_feather(sidecar_path)
+        print(f"Cached data to {sidecar_path}")
+    except Exception as e:
+        print(f"Could not write cache file '{sidecar_path}': {e}")
+
+def detect_encoding(filepath, sample_size=65536):
+    """Guesses the encoding of a text file from its first bytes, or returns None if it cannot be detected."""
+    if from_bytes is None:
+        return None
+    try:
+        with open(filepath, 'rb') as f:
+            best_match = from_bytes(f.read(sample_size)).best()
+        # Normalize e.g. 'utf_8' to 'utf-8' so it matches the fallback list
+        return codecs.lookup(best_match.encoding).name if best_match else None
+    except Exception as e:
+        print(f"Could not detect encoding of '{filepath}': {e}")
+        return None
+
+def read_csv_file(filepath, encoding):
+    """Reads a CSV file with the pyarrow engine when available, falling back to the C engine."""
+    # Adjust parameters if your CSV structure is different (e.g., separator, header row)
+    if CSV_ENGINE == 'pyarrow':
+        try:
+            return pd.read_csv(filepath, header=None, skiprows=1, index_col=0, encoding=encoding, engine='pyarrow')
+        except Exception as e:
+            print(f"pyarrow CSV engine failed ({e}), retrying with the C engine.")
+    return pd.read_csv(filepath, header=None, skiprows=1, index_col=0, encoding=encoding, engine='c')
+
+def read_excel_file(filepath):
+    """Reads an Excel file with the calamine engine when available, falling back to pandas' default engine."""
+    if EXCEL_ENGINE == 'calamine':
+        try:
+            return pd.read_excel(filepath, header=None, skiprows=1, index_col=0, engine='calamine')
+        except ValueError as e: # e.g. pandas older than 2.2 does not know the calamine engine
+            print(f"calamine Excel engine failed ({e}), retrying with the default engine.")
+    return pd.read_excel(filepath, header=None, skiprows=1, index_col=0)
 
 def load_data(filepath):
-    """Loads data from the specified Excel or CSV file, skipping header and using the first column as index."""
+    """Loads data from the specified Excel, CSV, Parquet or Feather file, skipping header and using the first column as index."""
     try:
         _, file_extension = os.path.splitext(filepath)
         file_extension = file_extension.lower()
 
-        if file_extension in ['.xlsx', '.xls']:
+        if FAST_IO and file_extension in ['.xlsx', '.xls', '.csv']:
+            df = load_sidecar(filepath)
+            if df is not None:
+                return df
+
+        if file_extension == '.parquet':
+            print(f"Loading Parquet file: {filepath}")
+            df = restore_frame_layout(pd.read_parquet(filepath, engine='pyarrow'))
+        elif file_extension == '.feather':
+            print(f"Loading Feather file: {filepath}")
+            df = restore_frame_layout(pd.read_feather(filepath))
+        elif file_extension in ['.xlsx', '.xls']:
             print(f"Loading Excel file: {filepath}")
-            df = pd.read_excel(filepath, header=None, skiprows=1, index_col=0)
+            df = read_excel_file(filepath)
         elif file_extension == '.csv':
             print(f"Loading CSV file: {filepath}")
-            # Try common encodings for CSV files
-            encodings_to_try = ['utf-8', 'gbk', 'latin1'] # GBK is common in Chinese Windows environments
+            # Try common encodings for CSV files, strictly in this order
+            # GBK is common in Chinese Windows environments. None stands for the detected encoding,
+            # only used once utf-8 and GBK failed (detection mistakes GBK for e.g. Big5), latin1 always decodes
+            encodings_to_try = ['utf-8', 'gbk', None, 'latin1']
             df = None
+            csv_encoding = None
             last_exception = None
             for encoding in encodings_to_try:
+                if encoding is None:
+                    encoding = detect_encoding(filepath)
+                    if not encoding or encoding in ('utf-8', 'gbk'):
+                        continue
+                    print(f"Detected CSV encoding: {encoding}")
                 try:
                     print(f"Attempting to read CSV with encoding: {encoding}")
-                    # Adjust parameters if your CSV structure is different (e.g., separator, header row)
-                    df = pd.read_csv(filepath, header=None, skiprows=1, index_col=0, encoding=encoding)
+                    df = read_csv_file(filepath, encoding)
                     print(f"Successfully read CSV with encoding: {encoding}")
+                    csv_encoding = encoding
                     break # Exit loop if successful
                 except UnicodeDecodeError as e:
                     print(f"Encoding {encoding} failed: {e}")
@@ -80,15 +232,21 @@ def load_data(filepath):
                     print(f"Last error encountered: {last_exception}")
                 return None # Return None if all encodings failed
         else:
-            print(f"Error: Unsupported file type '{file_extension}'. Please select an Excel (.xlsx, .xls) or CSV (.csv) file.")
+            print(f"Error: Unsupported file type '{file_extension}'. Please select an Excel (.xlsx, .xls), CSV (.csv), Parquet (.parquet) or Feather (.feather) file.")
             return None # Return None for unsupported types
 
-        # Convert to numeric, coercing errors
-        df = df.apply(pd.to_numeric, errors='coerce')
+        # Convert to numeric, coercing errors (only needed if the reader left non-numeric columns)
+        if not all(pd.api.types.is_numeric_dtype(dtype) for dtype in df.dtypes):
+            df = df.apply(pd.to_numeric, errors='coerce')
         # Drop rows/columns that are entirely NaN after coercion if necessary
         df.dropna(axis=0, how='all', inplace=True)
         df.dropna(axis=1, how='all', inplace=True)
         print(f"Loaded data with shape: {df.shape}")
+        # Only cache reliable decodings; a guessed or latin1 read may be garbled and would be served
+        # from the cache on every later run
+        if FAST_IO and (file_extension in ['.xlsx', '.xls'] or
+                        (file_extension == '.csv' and csv_encoding in ('utf-8', 'gbk'))):
+            write_sidecar(filepath, df)
         return df
     except FileNotFoundError:
         print(f"Error: File '{filepath}' not found.")
@@ -97,99 +255,313 @@ def load_data(filepath):
         print(f"Error loading data file '{filepath}': {e}")
         return None # Return None on other errors
 
+def cache_data_arrays():
+    """Caches the loaded DataFrame as plain NumPy arrays so redraws and clicks can index rows directly."""
+    global data, x_axis, x_is_sorted, y_values, row_labels, safe_labels, displayed_row, line_cache
+    x_axis = data.columns.to_numpy(dtype=np.float64)
+    x_is_sorted = bool(np.all(np.diff(x_axis) > 0))
+    # Full precision rows; data is rebuilt on top of the same array so it is not held twice
+    y_values = np.ascontiguousarray(data.to_numpy(dtype=np.float64))
+    data = pd.DataFrame(y_values, index=data.index, columns=data.columns, copy=False)
+    row_labels = data.index.to_numpy()
+    # Compile the snapping kernel for these array types now rather than on the first click
+    nearest_point_index(x_axis[:1], y_values[0, :1], 0.0, 0.0)
+    safe_labels = [make_safe_filename(str(label)) for label in row_labels]
+    line_cache = None
+    displayed_row = None
+
+def new_results(n_rows):
+    """Creates an empty selection array for n_rows rows."""
+    return np.full((n_rows, 2 * len(POINT_TYPES)), np.nan)
+
+def get_point(selection_row, point_type):
+    """Returns the (x, y) of a point from one row of the results array, or None if it is not set."""
+    col = 2 * POINT_TYPES.index(point_type)
+    x, y = selection_row[col], selection_row[col + 1]
+    return None if np.isnan(x) else (x, y)
+
+def set_point(row_idx, point_type, point):
+    """Stores the (x, y) of a point in the results array."""
+    col = 2 * POINT_TYPES.index(point_type)
+    results[row_idx, col:col + 2] = point
+
+def _nearest_index_loop(x, y, cx, cy):
+    """Index of the point closest to (cx, cy) in a single pass without temporaries (NaN points are skipped)."""
+    best = 0
+    best_dist = np.inf
+    for i in range(x.size):
+        d = (x[i] - cx) ** 2 + (y[i] - cy) ** 2
+        if d < best_dist:
+            best_dist = d
+            best = i
+    return best
+
+# fastmath is left off on purpose: it assumes no NaNs, and rows may contain them
+nearest_index_jit = njit(cache=True)(_nearest_index_loop) if njit is not None else None
+
+def nearest_point_index(x, y, cx, cy):
+    """Returns the index of the data point closest to (cx, cy)."""
+    if nearest_index_jit is not None:
+        return int(nearest_index_jit(x, y, cx, cy))
+    # Vectorized fallback (squared distance is enough for argmin, no need for sqrt)
+    dx = x - cx
+    dy = y - cy
+    distances = np.nan_to_num(dx * dx + dy * dy, copy=False, nan=np.inf)
+    return int(np.argmin(distances))
+
+def find_closest_index(y_data, cx, cy, window=4):
+    """Returns the index of the point of a row closest to (cx, cy), using binary search when x is sorted."""
+    if not x_is_sorted:
+        return nearest_point_index(x_axis, y_data, cx, cy)
+
+    # Search a few neighbours around the click position first
+    i = int(np.searchsorted(x_axis, cx))
+    lo = max(0, i - window)
+    hi = min(x_axis.size, i + window + 1)
+    best = lo + nearest_point_index(x_axis[lo:hi], y_data[lo:hi], cx, cy)
+
+    # Points further away in x than the best distance cannot be closer, so widen only if needed
+    best_dist = np.sqrt((x_axis[best] - cx) ** 2 + (y_data[best] - cy) ** 2)
+    if np.isnan(best_dist):
+        best_dist = np.inf
+    wide_lo = int(np.searchsorted(x_axis, cx - best_dist, side='left'))
+    wide_hi = int(np.searchsorted(x_axis, cx + best_dist, side='right'))
+    if wide_lo < lo or wide_hi > hi:
+        best = wide_lo + nearest_point_index(x_axis[wide_lo:wide_hi], y_data[wide_lo:wide_hi], cx, cy)
+    return best
+
+def decimate_for_display(x, y, n_bins):
+    """Min/max decimation of a line with sorted x: keeps the lowest and highest point of each bin so peaks stay visible."""
+    if n_bins <= 0 or y.size <= 2 * n_bins:
+        return x, y
+    starts = np.linspace(0, y.size, n_bins, endpoint=False).astype(np.intp)
+    ends = np.append(starts[1:], y.size)
+    x_out = np.empty(2 * n_bins, dtype=x.dtype)
+    x_out[0::2] = x[starts]
+    x_out[1::2] = x[ends - 1]
+    # fmin/fmax ignore NaN values unless a whole bin is NaN
+    y_out = np.empty(2 * n_bins, dtype=y.dtype)
+    y_out[0::2] = np.fmin.reduceat(y, starts)
+    y_out[1::2] = np.fmax.reduceat(y, starts)
+    return x_out, y_out
+
 def find_potential_peaks(y_data):
     """Finds potential peaks in the data."""
-    # Ensure data is numpy array
-    y_data_np = np.array(y_data)
-    # Handle NaN values if any - replace with interpolation or a constant (e.g., 0 or mean)
-    nan_mask = np.isnan(y_data_np)
-    if np.any(nan_mask):
-        print(f"Warning: NaN values found in row {current_row_index}. Replacing with 0 for peak finding.")
-        y_data_np[nan_mask] = 0 # Simple replacement, consider interpolation for better results
+    # Copy into a float array and replace NaN values with 0 in a single pass
+    # (simple replacement, consider interpolation for better results)
+    y_data_np = np.nan_to_num(np.array(y_data, dtype=np.float64), copy=False, nan=0.0)
 
     peaks, properties = find_peaks(y_data_np, prominence=PEAK_PROMINENCE, width=PEAK_WIDTH)
-    print(f"Found {len(peaks)} potential peaks in row {current_row_index}.")
     return peaks, properties
 
+def _peaks_for_row(y_data):
+    """Returns the peak indices of one row (top-level so it can run in worker processes)."""
+    peaks, _ = find_potential_peaks(y_data)
+    return peaks
+
+def prepopulate_peaks():
+    """Finds peak candidates for every row once after loading, so navigation only needs a lookup."""
+    peak_candidates.clear()
+    all_peaks = None
+    if num_rows >= PARALLEL_PEAKS_MIN_ROWS:
+        try:
+            # Rows are independent, so spread them over processes
+            with ProcessPoolExecutor() as executor:
+                all_peaks = list(executor.map(_peaks_for_row, y_values, chunksize=64))
+        except Exception as e:
+            print(f"Parallel peak finding failed ({e}), finding peaks row by row instead.")
+            all_peaks = None
+    if all_peaks is None:
+        all_peaks = [_peaks_for_row(y_data) for y_data in y_values]
+
+    for row_idx, peaks in enumerate(all_peaks):
+        peak_candidates[row_idx] = (x_axis[peaks], y_values[row_idx, peaks])
+    print(f"Found peak candidates for {num_rows} rows.")
+
+def create_row_artists(target_ax, animated=False):
+    """Creates the line, peak, selection and text box artists used to plot one row on target_ax."""
+    row_line, = target_ax.plot([], [], 'b-', linewidth=1)
+    peaks_scatter = target_ax.scatter([], [], color='green', s=50, alpha=0.5)
+
+    # One marker + annotation per selection point, hidden until the point is set
+    markers = {}
+    for point_type, color in POINT_COLORS.items():
+        marker = target_ax.scatter([], [], color=color, s=100, animated=animated)
+        label = target_ax.annotate('', (0, 0),
+                                   xytext=(10, 10), textcoords='offset points',
+                                   color=color, fontweight='bold', animated=animated)
+        label.set_visible(False)
+        markers[point_type] = (marker, label)
+
+    target_ax.set_xlabel('X Values')
+    target_ax.set_ylabel('Y Values')
+    target_ax.grid(True)
+
+    # Text box with coordinates
+    props = dict(boxstyle='round', facecolor='wheat', alpha=0.5)
+    text_box = target_ax.text(0.02, 0.98, '', transform=target_ax.transAxes, fontsize=10,
+                              verticalalignment='top', bbox=props, animated=animated)
+    return row_line, peaks_scatter, markers, text_box
+
+def set_selection_artists(markers, text_box, selections, row_label):
+    """Moves the selection markers and annotations to the given selections and updates the text box."""
+    coord_text = f"Row: {row_label}"
+    for point_type, (marker, label) in markers.items():
+        point = get_point(selections, point_type)
+        if point is not None:
+            x, y = point
+            marker.set_offsets([[x, y]])
+            label.xy = (x, y)
+            label.set_text(f"{point_type.upper()}: ({x:.2f}, {y:.2f})")
+            label.set_visible(True)
+            coord_text += f"\n{point_type.upper()}: ({x:.2f}, {y:.2f})"
+        else:
+            marker.set_offsets(np.empty((0, 2)))
+            label.set_visible(False)
+    text_box.set_text(coord_text)
+
+def get_peak_candidates(row_idx):
+    """Returns the (x, y) arrays of the peak candidates of a row, finding them if not already stored."""
+    if row_idx not in peak_candidates:
+        y_data = y_values[row_idx]
+        peaks, _ = find_potential_peaks(y_data)
+        peak_candidates[row_idx] = (x_axis[peaks], y_data[peaks])
+        print(f"Found {len(peaks)} potential peaks in row {row_labels[row_idx]}.")
+    return peak_candidates[row_idx]
+
+def init_plot_artists():
+    """Clears the axes and creates the persistent artists that update_plot() modifies in place."""
+    global line, scatter_peaks, selection_artists, coord_text_box, displayed_row
+
+    ax.clear()
+    displayed_row = None
+    line, scatter_peaks, selection_artists, coord_text_box = create_row_artists(ax, animated=True)
+    # ax.clear() resets the axes callbacks, so (re)connect here
+    ax.callbacks.connect('xlim_changed', on_xlim_changed)
+
+def get_selection_artist_list():
+    """Returns the animated artists that are redrawn on top of the cached background."""
+    artists = []
+    for marker, label in selection_artists.values():
+        artists.extend((marker, label))
+    artists.append(coord_text_box)
+    return artists
+
+def draw_selection_artists():
+    """Draws the animated selection artists onto the canvas renderer."""
+    for artist in get_selection_artist_list():
+        ax.draw_artist(artist)
+
+def set_selection_animated(animated):
+    """Toggles the animated flag of the selection artists (animated artists are skipped by savefig)."""
+    for artist in get_selection_artist_list():
+        artist.set_animated(animated)
+
+def on_resize(event):
+    """Recomputes the decimated line for the new axes width."""
+    if data is not None and not data.empty:
+        update_plot()
+
+def on_draw(event):
+    """Caches the static background after every full redraw and draws the selection artists on top."""
+    global plot_background
+    # Skip stale axes and exports (savefig draws with the selection artists un-animated)
+    if line is None or line not in ax.lines or not coord_text_box.get_animated():
+        plot_background = None
+        return
+    # The whole figure, since annotations near the top/right limits extend past the axes
+    plot_background = fig.canvas.copy_from_bbox(fig.bbox)
+    draw_selection_artists()
+
+def refresh_selection():
+    """Redraws only the selection artists, blitting them over the cached background when possible."""
+    if line is None or line not in ax.lines or plot_background is None:
+        update_plot()
+        return
+    update_selection_artists()
+    fig.canvas.restore_region(plot_background)
+    draw_selection_artists()
+    fig.canvas.blit(fig.bbox)
+    fig.canvas.flush_events()
+
+def update_selection_artists():
+    """Updates the selection markers, annotations and coordinates text box for the current row."""
+    set_selection_artists(selection_artists, coord_text_box,
+                          results[current_row_index], row_labels[current_row_index])
+
+def set_line_data(row_idx):
+    """Sets the line to a row, min/max-decimated over the visible x range if it has more than two points per pixel column."""
+    global line_cache
+    y_data = y_values[row_idx]
+    if not x_is_sorted:
+        line.set_data(x_axis, y_data)
+        return
+
+    first, last = 0, x_axis.size
+    if not ax.get_autoscalex_on():
+        # Zoomed/panned: only the visible part, plus one point each side so the line reaches the edges.
+        # When zoomed in far enough this is the full-resolution data, matching where clicks snap to.
+        x_min, x_max = sorted(ax.get_xlim())
+        first = max(0, int(np.searchsorted(x_axis, x_min, side='left')) - 1)
+        last = min(x_axis.size, int(np.searchsorted(x_axis, x_max, side='right')) + 1)
+    cache_key = (row_idx, first, last, int(ax.bbox.width))
+    if line_cache is None or line_cache[0] != cache_key:
+        line_cache = (cache_key, decimate_for_display(x_axis[first:last], y_data[first:last], cache_key[3]))
+    line.set_data(*line_cache[1])
+
+def on_xlim_changed(changed_ax):
+    """Re-decimates the line for the new visible x range after zooming or panning."""
+    if displayed_row is None or line is None or line not in ax.lines:
+        return
+    set_line_data(displayed_row)
+    fig.canvas.draw_idle()
+
 def update_plot():
     """Updates the plot for the current row."""
-    global scatter_peaks
+    global displayed_row
 
     if data is None or data.empty or current_row_index >= len(data):
         ax.clear()
         ax.set_title("No data loaded or invalid row index")
-        ax.text(0.5, 0.5, "Load a valid data file (Excel/CSV)", ha='center', va='center', transform=ax.transAxes)
+        ax.text(0.5, 0.5, "Load a valid data file (Excel/CSV/Parquet/Feather)", ha='center', va='center', transform=ax.transAxes)
         fig.canvas.draw_idle()
         return
 
-    # Get current row data
-    row_data = data.iloc[current_row_index]
-    x_data = row_data.index.values
-    y_data = row_data.values
+    # Recreate the artists if the axes were cleared (e.g. after an error message was shown)
+    if line is None or line not in ax.lines:
+        init_plot_artists()
 
     # Get row label for display
-    row_label = data.index[current_row_index]
+    row_label = row_labels[current_row_index]
 
-    # Clear the plot
-    ax.clear()
+    # Plot peak candidates
+    peak_x, peak_y = get_peak_candidates(current_row_index)
+    scatter_peaks.set_offsets(np.column_stack((peak_x, peak_y)))
 
-    # Plot the data
-    ax.plot(x_data, y_data, 'b-', linewidth=1)
+    # Plot current selections and coordinates text box
+    update_selection_artists()
 
-    # Find peaks if not already stored
-    if current_row_index not in peak_candidates:
-        peaks, _ = find_peaks(y_data, prominence=PEAK_PROMINENCE, width=PEAK_WIDTH)
-        peak_candidates[current_row_index] = [(x_data[p], y_data[p]) for p in peaks]
-        print(f"Found {len(peaks)} potential peaks in row {row_label}.")
+    # Set title
+    ax.set_title(f'Row: {row_label} - Click to select LEFT, TOP, RIGHT points in order')
 
-    # Plot peak candidates
-    peak_x = [p[0] for p in peak_candidates[current_row_index]]
-    peak_y = [p[1] for p in peak_candidates[current_row_index]]
-    scatter_peaks = ax.scatter(peak_x, peak_y, color='green', s=50, alpha=0.5)
+    # A new row always starts fully autoscaled, even if the previous one was zoomed/panned
+    # (which turns autoscaling off), and the toolbar's Home goes back to this row's view
+    if current_row_index != displayed_row:
+        displayed_row = current_row_index
+        ax.set_autoscale_on(True)
+        if fig.canvas.toolbar is not None:
+            fig.canvas.toolbar.update() # Clear the view history
 
-    # Get current selections for this row
-    current_selections = results[current_row_index]
+    # Plot the data
+    set_line_data(displayed_row)
 
-    # Plot current selections if they exist
-    points_to_plot = []
-    if current_selections['left']:
-        points_to_plot.append(('left', current_selections['left'], 'red'))
-    if current_selections['top']:
-        points_to_plot.append(('top', current_selections['top'], 'blue'))
-    if current_selections['right']:
-        points_to_plot.append(('right', current_selections['right'], 'purple'))
-
-    # If there are selected points to plot
-    if points_to_plot:
-        for label, point, color in points_to_plot:
-            ax.scatter(point[0], point[1], color=color, s=100)
-            ax.annotate(f"{label.upper()}: ({point[0]:.2f}, {point[1]:.2f})",
-                       (point[0], point[1]),
-                       xytext=(10, 10), textcoords='offset points',
-                       color=color, fontweight='bold')
-
-    # Set title and labels
-    ax.set_title(f'Row: {row_label} - Click to select LEFT, TOP, RIGHT points in order')
-    ax.set_xlabel('X Values')
-    ax.set_ylabel('Y Values')
-    ax.grid(True)
-
-    # Add coordinates text box
-    coord_text = f"Row: {row_label}\n"
-    if current_selections['left']:
-        x, y = current_selections['left']
-        coord_text += f"LEFT: ({x:.2f}, {y:.2f})\n"
-    if current_selections['top']:
-        x, y = current_selections['top']
-        coord_text += f"TOP: ({x:.2f}, {y:.2f})\n"
-    if current_selections['right']:
-        x, y = current_selections['right']
-        coord_text += f"RIGHT: ({x:.2f}, {y:.2f})"
-
-    # Add text box with coordinates
-    props = dict(boxstyle='round', facecolor='wheat', alpha=0.5)
-    ax.text(0.02, 0.98, coord_text, transform=ax.transAxes, fontsize=10,
-            verticalalignment='top', bbox=props)
+    # Rescale to the line and the selected points (relim() ignores scatter collections,
+    # so manually entered points outside the line's range are added explicitly)
+    ax.relim()
+    selected = [p for p in (get_point(results[current_row_index], t) for t in POINT_TYPES) if p is not None]
+    if selected:
+        ax.update_datalim(selected)
+    ax.autoscale_view()
 
     # Update the figure
     fig.canvas.draw_idle()
@@ -200,45 +572,57 @@ def on_click(event):
         return
 
     # Get current row data
-    row_data = data.iloc[current_row_index]
-    x_data = row_data.index.values
-    y_data = row_data.values
+    x_data = x_axis
+    y_data = y_values[current_row_index]
 
     # Find the closest actual data point to where the user clicked
-    distances = [(x - event.xdata)**2 + (y - event.ydata)**2 for x, y in zip(x_data, y_data)]
-    closest_idx = np.argmin(distances)
+    closest_idx = find_closest_index(y_data, event.xdata, event.ydata)
     closest_x = x_data[closest_idx]
     closest_y = y_data[closest_idx]
 
     # Get the current selections for this row
     current_selections = results[current_row_index]
 
-    # Determine which point type to set next
-    if current_selections['left'] is None:
-        point_type = 'left'
-        color = 'red'
-    elif current_selections['top'] is None:
-        point_type = 'top'
-        color = 'blue'
-    elif current_selections['right'] is None:
-        point_type = 'right'
-        color = 'purple'
-    else:
+    # Determine which point type to set next (LEFT, then TOP, then RIGHT)
+    unset_points = [t for t in POINT_TYPES if get_point(current_selections, t) is None]
+    if not unset_points:
         # If all points are already set, reset them
-        results[current_row_index] = {'left': None, 'top': None, 'right': None}
-        update_plot()  # Redraw the plot
+        results[current_row_index] = np.nan
+        refresh_selection()  # Redraw the selection
         return
+    point_type = unset_points[0]
 
     # Store the selected point (using the closest actual data point)
-    results[current_row_index][point_type] = (closest_x, closest_y)
+    set_point(current_row_index, point_type, (closest_x, closest_y))
     print(f"Selected {point_type.upper()} point at ({closest_x:.4f}, {closest_y:.4f})")
 
     # Update the plot to show the selection
-    update_plot()
+    refresh_selection()
 
     # If this completes a set, provide feedback
     if point_type == 'right':
-        print(f"All points selected for row {data.index[current_row_index]}.")
+        print(f"All points selected for row {row_labels[current_row_index]}.")
+
+def trailing_redraw():
+    """Draws the latest row once the burst of throttled navigation key presses is over."""
+    global redraw_timer, last_draw_time
+    redraw_timer = None
+    last_draw_time = time.perf_counter()
+    update_plot()
+
+def request_redraw():
+    """Redraws right away unless the last redraw was very recent; then schedules one trailing redraw."""
+    global redraw_timer, last_draw_time
+    now = time.perf_counter()
+    if now - last_draw_time > NAV_REDRAW_INTERVAL:
+        last_draw_time = now
+        update_plot()
+    elif redraw_timer is None:
+        # Further key presses only move current_row_index, the timer draws whichever row is current
+        redraw_timer = fig.canvas.new_timer(interval=20)
+        redraw_timer.single_shot = True
+        redraw_timer.add_callback(trailing_redraw)
+        redraw_timer.start()
 
 def on_key(event):
     """Handles key presses for navigation and manual input."""
@@ -253,11 +637,11 @@ def on_key(event):
     if event.key == 'right':
         current_row_index = (current_row_index + 1) % num_rows
         print(f"Navigating to next row: {data.index[current_row_index]}")
-        update_plot()
+        request_redraw() # Throttled, holding the key fires many events
     elif event.key == 'left':
         current_row_index = (current_row_index - 1 + num_rows) % num_rows
         print(f"Navigating to previous row: {data.index[current_row_index]}")
-        update_plot()
+        request_redraw()
     elif event.key == 'm': # Manual input
         manual_input()
     elif event.key == 'c': # Clear selection for current row
@@ -273,19 +657,16 @@ def on_key(event):
 
 def clear_selection():
     """Clears the selection for the current row."""
-    global selected_points, scatter_selected
     if data is None or data.empty:
         print("No data loaded, cannot clear selection.")
         return
     print(f"Clearing selection for row {data.index[current_row_index]}")
-    selected_points = {'top': None, 'left': None, 'right': None}
-    results[current_row_index] = selected_points # Update stored results
+    results[current_row_index] = np.nan # Update stored results
     # Re-draw plot to remove points visually
     update_plot()
 
 def manual_input():
     """Allows manual input of coordinates via the console."""
-    global selected_points
     if data is None or data.empty:
         print("No data loaded, cannot perform manual input.")
         return
@@ -294,6 +675,7 @@ def manual_input():
     print("Enter coordinates as 'x,y' or leave blank to skip.")
 
     try:
+        selected_points = {}
         top_str = input("Enter TOP coordinates (x,y): ")
         if top_str:
             x_str, y_str = top_str.split(',')
@@ -310,7 +692,8 @@ def manual_input():
             selected_points['right'] = (float(x_str.strip()), float(y_str.strip()))
 
         print("Manual input complete.")
-        results[current_row_index] = selected_points # Store selection
+        for point_type, point in selected_points.items(): # Store selection
+            set_point(current_row_index, point_type, point)
         update_plot()
 
     except ValueError:
@@ -333,27 +716,14 @@ def save_results():
     output_filename = f"{base_name}_peak_results.csv"
 
     print(f"\nSaving results to {output_filename}...")
-    output_data = []
-    for row_idx, points in results.items():
-        # Ensure row_idx is valid before accessing data.index
-        if row_idx < len(data):
-            row_label = data.index[row_idx]
-            output_data.append({
-                'RowLabel': row_label,
-                'Left_X': points['left'][0] if points['left'] else None,
-                'Left_Y': points['left'][1] if points['left'] else None,
-                'Top_X': points['top'][0] if points['top'] else None,
-                'Top_Y': points['top'][1] if points['top'] else None,
-                'Right_X': points['right'][0] if points['right'] else None,
-                'Right_Y': points['right'][1] if points['right'] else None,
-            })
-        else:
-             print(f"Warning: Skipping invalid row index {row_idx} during save.")
-
-
-    results_df = pd.DataFrame(output_data)
     try:
-        results_df.to_csv(output_filename, index=False)
+        # Write rows directly instead of building an intermediate DataFrame
+        with open(output_filename, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['RowLabel', 'Left_X', 'Left_Y', 'Top_X', 'Top_Y', 'Right_X', 'Right_Y'])
+            # Unset points (NaN) are written as empty cells
+            writer.writerows([row_label] + ['' if np.isnan(v) else v for v in row]
+                             for row_label, row in zip(row_labels, results))
         print(f"Results saved successfully to {output_filename}.")
 
         # 同时保存当前行的图表, 传递文件名基础部分
@@ -388,7 +758,7 @@ def switch_file_button_clicked(event):
     change_data_file()
 
 def change_data_file():
-    """Allow user to select a new data file (Excel or CSV)"""
+    """Allow user to select a new data file (Excel, CSV, Parquet or Feather)"""
     global data, data_filepath, current_row_index, num_rows, results, peak_candidates
 
     try:
@@ -396,9 +766,10 @@ def change_data_file():
         root.withdraw()  # Hide main window
         new_file = filedialog.askopenfilename(
             title="Select Data File",
-            filetypes=[("Supported Files", "*.xlsx *.xls *.csv"),
+            filetypes=[("Supported Files", "*.xlsx *.xls *.csv *.parquet *.feather"),
                        ("Excel files", "*.xlsx *.xls"),
                        ("CSV files", "*.csv"),
+                       ("Parquet/Feather files", "*.parquet *.feather"),
                        ("All files", "*.*")]
         )
         root.destroy()
@@ -423,16 +794,37 @@ def change_data_file():
             data = new_data # Assign the successfully loaded data
             data_filepath = new_file # Update the global filepath
             num_rows = data.shape[0]
+            cache_data_arrays()
             current_row_index = 0
-            # Initialize results dictionary for the new data size
-            results = {i: {'top': None, 'left': None, 'right': None} for i in range(num_rows)}
-            peak_candidates.clear() # Clear peak candidates for new file
+            # Initialize results array for the new data size
+            results = new_results(num_rows)
+            prepopulate_peaks() # Replace peak candidates with those of the new file
             update_plot() # Update plot with the first row of new data
             print(f"Successfully loaded new data file '{data_filepath}' with {num_rows} rows.")
 
     except Exception as e:
         print(f"Error changing data file: {e}")
 
+def ensure_plot_dir():
+    """Creates PLOT_DIR if needed. Only touches the filesystem until it has succeeded once."""
+    global plot_dir_ready
+    if plot_dir_ready:
+        return True
+    try:
+        os.makedirs(PLOT_DIR, exist_ok=True)
+        plot_dir_ready = True
+        return True
+    except OSError as e:
+        print(f"Error creating directory {PLOT_DIR}: {e}")
+        return False
+
+def get_plot_path(filename_prefix, row_idx):
+    """Builds the image path for a row inside PLOT_DIR."""
+    # 使用来源文件前缀和行标签作为文件名一部分, 并加入目录路径
+    # Row labels are sanitized once after loading
+    filename = f"{filename_prefix}_peak_plot_{safe_labels[row_idx]}.png"
+    return os.path.join(PLOT_DIR, filename)
+
 def save_plot(row_idx=None, filename_prefix=None):
     """保存当前图表为图片文件到 'plots' 文件夹, 文件名包含来源文件和行标签"""
     global data_filepath # Needed if prefix is not provided
@@ -456,34 +848,66 @@ def save_plot(row_idx=None, filename_prefix=None):
          print(f"Error: Invalid row index ({row_idx}) for saving plot.")
          return
 
-    row_label = data.index[row_idx]
+    # Create the plots directory if startup could not
+    if not ensure_plot_dir():
+        return # Exit if directory creation fails
 
-    # Create the plots directory if it doesn't exist
-    if not os.path.exists(PLOT_DIR):
-        try:
-            os.makedirs(PLOT_DIR)
-            print(f"Created directory: {PLOT_DIR}")
-        except OSError as e:
-            print(f"Error creating directory {PLOT_DIR}: {e}")
-            return # Exit if directory creation fails
-
-    # 使用来源文件前缀和行标签作为文件名一部分, 并加入目录路径
-    # Ensure row_label is safe for filenames
-    safe_row_label = "".join(c if c.isalnum() or c in (' ', '.', '_', '-') else '_' for c in str(row_label)).rstrip()
-    filename = f"{filename_prefix}_peak_plot_{safe_row_label}.png"
-    filepath = os.path.join(PLOT_DIR, filename)
+    filepath = get_plot_path(filename_prefix, row_idx)
 
     try:
         # 保存当前图表
-        fig.savefig(filepath, dpi=300, bbox_inches='tight')
+        # Animated (blitted) artists are not drawn by savefig, so include them for the export
+        set_selection_animated(False)
+        try:
+            fig.savefig(filepath, dpi=300, bbox_inches='tight')
+        finally:
+            set_selection_animated(True)
         print(f"图表已保存至：{filepath}")
     except Exception as e:
         print(f"保存图表时出错 ({filepath}): {e}")
 
+def _init_export_worker(x_values, dpi):
+    """Creates the off-screen figure that _render_one reuses for every row in this process."""
+    global export_state
+    export_fig = Figure(figsize=(12, 7))
+    FigureCanvasAgg(export_fig)
+    export_ax = export_fig.add_subplot()
+    export_state = {
+        'fig': export_fig,
+        'ax': export_ax,
+        'artists': create_row_artists(export_ax),
+        'x': x_values,
+        'x_sorted': bool(np.all(np.diff(x_values) > 0)),
+        'dpi': dpi,
+    }
+
+def _render_one(args):
+    """Renders one row on the off-screen figure and saves it. Returns an error message or None."""
+    y_data, peak_x, peak_y, selections, row_label, out_path = args
+    export_fig, export_ax = export_state['fig'], export_state['ax']
+    row_line, peaks_scatter, markers, text_box = export_state['artists']
+    try:
+        if export_state['x_sorted']:
+            # One bin per pixel column of the saved image
+            n_bins = int(export_ax.bbox.width * export_state['dpi'] / export_fig.dpi)
+            row_line.set_data(*decimate_for_display(export_state['x'], y_data, n_bins))
+        else:
+            row_line.set_data(export_state['x'], y_data)
+        peaks_scatter.set_offsets(np.column_stack((peak_x, peak_y)))
+        set_selection_artists(markers, text_box, selections, row_label)
+        export_ax.set_title(f'Row: {row_label}')
+        export_ax.relim()
+        export_ax.autoscale_view()
+        # Per row, since tick label widths depend on the row's values (cheap next to PNG encoding)
+        export_fig.tight_layout()
+        export_fig.savefig(out_path, dpi=export_state['dpi'])
+        return None
+    except Exception as e:
+        return f"Error saving plot for row {row_label}: {e}"
+
 def save_all_plots():
     """保存所有行的图表到 'plots' 文件夹, 文件名包含来源文件"""
     global data_filepath # Ensure we are using the global variable
-    current_idx = current_row_index  # 保存当前位置
 
     if not data_filepath:
         print("Error: No data file loaded. Cannot save all plots.")
@@ -494,50 +918,58 @@ def save_all_plots():
 
     base_name = get_base_filename(data_filepath)
     print(f"\nAttempting to save all {num_rows} plots for '{base_name}' to '{PLOT_DIR}' directory...")
-    saved_count = 0
-    error_count = 0
-    try:
-        # 遍历所有行并保存
-        for idx in range(num_rows):
-            current_row_index = idx
-            update_plot()  # 更新为当前行的图表
-            # Add a small pause for the plot to potentially render if needed, though usually not necessary for saving
-            # plt.pause(0.01)
-            try:
-                save_plot(idx, filename_prefix=base_name) # Pass the base name
-                saved_count += 1
-            except Exception as plot_e:
-                print(f"Error saving plot for row {data.index[idx]}: {plot_e}")
-                error_count += 1
-
-        print(f"Finished saving plots: {saved_count} saved, {error_count} errors. Files saved to '{PLOT_DIR}' directory.")
-    except Exception as e:
-        print(f"保存所有图表时发生意外错误：{e}")
-    finally:
-        # 恢复原来的位置
-        current_row_index = current_idx
-        update_plot()
+    if not ensure_plot_dir():
+        return
+
+    # Plain arrays/tuples for every row, so they can be sent to worker processes.
+    # The interactive window is left untouched.
+    render_args = []
+    for idx in range(num_rows):
+        peak_x, peak_y = get_peak_candidates(idx)
+        render_args.append((y_values[idx], peak_x, peak_y, results[idx], row_labels[idx],
+                            get_plot_path(base_name, idx)))
+
+    errors = None
+    if num_rows >= PARALLEL_EXPORT_MIN_ROWS:
+        try:
+            # Matplotlib is not thread-safe, so PNG rendering/encoding is spread over processes
+            with ProcessPoolExecutor(initializer=_init_export_worker,
+                                     initargs=(x_axis, BATCH_PLOT_DPI)) as executor:
+                errors = list(executor.map(_render_one, render_args, chunksize=8))
+        except Exception as e:
+            print(f"Parallel export failed ({e}), saving plots one by one instead.")
+            errors = None
+
+    if errors is None:
+        try:
+            _init_export_worker(x_axis, BATCH_PLOT_DPI)
+            # 遍历所有行并保存
+            errors = [_render_one(args) for args in render_args]
+        except Exception as e:
+            print(f"保存所有图表时发生意外错误：{e}")
+            return
+
+    error_messages = [error for error in errors if error]
+    for error in error_messages:
+        print(error)
+    saved_count = len(errors) - len(error_messages)
+    print(f"Finished saving plots: {saved_count} saved, {len(error_messages)} errors. Files saved to '{PLOT_DIR}' directory.")
 
 # --- Main Execution ---
 if __name__ == "__main__":
-    # Ensure the plot directory exists at startup as well
-    if not os.path.exists(PLOT_DIR):
-        try:
-            os.makedirs(PLOT_DIR)
-            print(f"Created directory: {PLOT_DIR}")
-        except OSError as e:
-            print(f"Error creating directory {PLOT_DIR} at startup: {e}")
-            # Decide if you want to exit or continue without saving plots
-            # sys.exit(1)
+    # Ensure the plot directory exists at startup, saving plots then skips the check
+    # (check the return value if you want to exit instead of continuing without saving plots)
+    ensure_plot_dir()
 
     # --- Ask user for the initial file ---
     root = Tk()
     root.withdraw() # Hide the main Tk window
     initial_file = filedialog.askopenfilename(
         title="Select Initial Data File",
-        filetypes=[("Supported Files", "*.xlsx *.xls *.csv"),
+        filetypes=[("Supported Files", "*.xlsx *.xls *.csv *.parquet *.feather"),
                    ("Excel files", "*.xlsx *.xls"),
                    ("CSV files", "*.csv"),
+                   ("Parquet/Feather files", "*.parquet *.feather"),
                    ("All files", "*.*")]
     )
     root.destroy()
@@ -556,20 +988,24 @@ if __name__ == "__main__":
         sys.exit(1)
 
     num_rows = data.shape[0]
+    cache_data_arrays()
+    prepopulate_peaks()
 
-    # Initialize results dictionary
-    results = {i: {'top': None, 'left': None, 'right': None} for i in range(num_rows)}
+    # Initialize results array
+    results = new_results(num_rows)
 
     # Create plot - adjust layout to make space for buttons
     fig, ax = plt.subplots(figsize=(12, 7)) # Increased height slightly
     plt.subplots_adjust(bottom=0.2) # Increase bottom margin for buttons
 
     # Initialize plot elements that will be updated
-    scatter_peaks = None
+    init_plot_artists()
 
     # Connect event handlers
     fig.canvas.mpl_connect('button_press_event', on_click)
     fig.canvas.mpl_connect('key_press_event', on_key)
+    fig.canvas.mpl_connect('draw_event', on_draw)
+    fig.canvas.mpl_connect('resize_event', on_resize)
 
     # Initial plot
     update_plot()
@@ -581,7 +1017,7 @@ if __name__ == "__main__":
     print(" - 'm' key: Enter manual input mode in console.")
     print(" - 'c' key: Clear selection for current row.")
     print(" - 's' key or Save button: Save all collected results to a CSV file named after the input file.")
-    print(" - 'o' key or Switch File button: Open a new data file (Excel or CSV).")
+    print(" - 'o' key or Switch File button: Open a new data file (Excel, CSV, Parquet or Feather).")
     print(f" - 'p' key or Save Plot button: Save current plot as image to '{PLOT_DIR}' folder.")
     print(f" - 'a' key: Save all plots as images to '{PLOT_DIR}' folder.")
     print(" - Close the plot window to exit the program.")